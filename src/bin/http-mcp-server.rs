@@ -3,145 +3,143 @@
 //!
 //! Provides tools: fetch_url, check_weather, get_time, calculate
 
-use anyhow::{Context, Result};
+use anyhow::{Context, Result, bail};
 use chrono::{FixedOffset, Utc};
 use rand::Rng;
+use replicante::mcp_server::{
+    INPUT_BUFFER_SIZE, OUTPUT_BUFFER_SIZE, ResponseTemplate, RpcRequest, ToolResult,
+    error_response, is_initialized_notification, write_message_async,
+};
 use serde_json::{Value, json};
-use std::io::{self, BufRead, BufReader, Write};
+use std::collections::HashMap;
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::{Arc, Mutex, MutexGuard, PoisonError};
 use std::time::Duration;
+use tokio::io::{AsyncBufReadExt, AsyncWriteExt, BufReader, BufWriter};
+use tokio::sync::{Semaphore, mpsc};
+
+/// Number of response body bytes returned by fetch_url
+const FETCH_PREVIEW_BYTES: usize = 500;
+
+/// Domains fetch_url may contact, including their subdomains
+const SAFE_DOMAINS: [&str; 3] = [
+    "httpbin.org",
+    "jsonplaceholder.typicode.com",
+    "api.github.com",
+];
+
+/// Redirect hops fetch_url follows, matching reqwest's default limit
+const MAX_REDIRECTS: usize = 10;
+
+/// Unread body bytes worth draining so the connection can return to the pool
+const FETCH_DRAIN_BYTES: u64 = 64 * 1024;
+
+/// Parsed calculator expressions kept before the cache is reset
+const EXPRESSION_CACHE_CAPACITY: usize = 1024;
+
+/// Requests handled concurrently before reading from stdin pauses
+const MAX_IN_FLIGHT_REQUESTS: usize = 64;
+
+/// Idle message buffers kept for reuse by later requests
+const BUFFER_POOL_CAPACITY: usize = 64;
+
+/// Buffers that grew past this size are dropped instead of being pooled
+const MAX_POOLED_BUFFER_SIZE: usize = 64 * 1024;
+
+/// Conditions reported by the mock weather tool
+const WEATHER_CONDITIONS: [&str; 4] = ["Sunny", "Cloudy", "Rainy", "Partly Cloudy"];
+
+/// Supported timezone abbreviations and their fixed offsets from UTC in seconds
+const TIMEZONE_OFFSETS: [(&str, i32); 5] = [
+    ("UTC", 0),
+    ("EST", -5 * 3600),
+    ("PST", -8 * 3600),
+    ("CET", 3600),
+    ("JST", 9 * 3600),
+];
 
 /// HTTP MCP Server implementation
 struct HttpMCPServer {
-    initialized: bool,
+    initialized: AtomicBool,
     client: reqwest::Client,
+    expression_cache: Mutex<HashMap<String, evalexpr::Node>>,
+    buffer_pool: Mutex<Vec<Vec<u8>>>,
+    initialize_response: ResponseTemplate,
+    tools_list_response: ResponseTemplate,
 }
 
 impl HttpMCPServer {
-    fn new() -> Self {
+    fn new() -> Result<Self> {
         let client = reqwest::Client::builder()
             .timeout(Duration::from_secs(5))
             .user_agent("MCP-Test/1.0")
+            .redirect(safe_redirect_policy())
             .build()
-            .expect("Failed to create HTTP client");
+            .context("Failed to create HTTP client")?;
 
-        Self {
-            initialized: false,
+        Ok(Self {
+            initialized: AtomicBool::new(false),
             client,
-        }
+            expression_cache: Mutex::new(HashMap::new()),
+            buffer_pool: Mutex::new(Vec::new()),
+            initialize_response: ResponseTemplate::new(&initialize_result())?,
+            tools_list_response: ResponseTemplate::new(&json!({ "tools": tool_definitions() }))?,
+        })
     }
 
     /// Handle JSON-RPC request
-    fn handle_request(&mut self, request: Value) -> Result<Option<Value>> {
-        let method = request.get("method").and_then(|m| m.as_str()).unwrap_or("");
-
-        let default_params = json!({});
-        let params = request.get("params").unwrap_or(&default_params);
-
-        let request_id = request.get("id");
+    async fn handle_request(&self, request: RpcRequest, reply: &mut Vec<u8>) -> Result<()> {
+        let method = request.method.as_str();
+        let params = &request.params;
+        let request_id = request.id.as_ref();
 
         eprintln!("[HTTP MCP] Handling request: {}", method);
 
         match method {
-            "initialize" => Ok(Some(self.handle_initialize(request_id, params)?)),
+            "initialize" => self.handle_initialize(request_id, params, reply),
             "initialized" => {
                 // Notification, no response needed
-                self.initialized = true;
+                self.initialized.store(true, Ordering::Relaxed);
                 eprintln!("[HTTP MCP] Client confirmed initialization");
-                Ok(None)
+                Ok(())
             }
-            "tools/list" => Ok(Some(self.handle_tools_list(request_id)?)),
-            "tools/call" => Ok(Some(self.handle_tool_call(request_id, params)?)),
-            _ => Ok(Some(self.error_response(
+            "tools/list" => self.handle_tools_list(request_id, reply),
+            "tools/call" => self.handle_tool_call(request_id, params, reply).await,
+            _ => error_response(
                 request_id,
                 -32601,
                 &format!("Method not found: {}", method),
-            ))),
+                reply,
+            ),
         }
     }
 
     /// Handle initialize request
-    fn handle_initialize(&self, request_id: Option<&Value>, params: &Value) -> Result<Value> {
+    fn handle_initialize(
+        &self,
+        request_id: Option<&Value>,
+        params: &Value,
+        reply: &mut Vec<u8>,
+    ) -> Result<()> {
         let default_client_info = json!({});
         let client_info = params.get("clientInfo").unwrap_or(&default_client_info);
         eprintln!("[HTTP MCP] Initialize request from client: {}", client_info);
 
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "serverInfo": {
-                    "name": "http-mcp-server",
-                    "version": "1.0.0"
-                },
-                "capabilities": {
-                    "tools": {
-                        "listChanged": true
-                    }
-                }
-            }
-        }))
+        self.initialize_response.render(request_id, reply)
     }
 
     /// Return list of available tools
-    fn handle_tools_list(&self, request_id: Option<&Value>) -> Result<Value> {
-        let tools = json!([
-            {
-                "name": "fetch_url",
-                "description": "Fetch content from a URL",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "url": {"type": "string", "description": "The URL to fetch"}
-                    },
-                    "required": ["url"]
-                }
-            },
-            {
-                "name": "check_weather",
-                "description": "Get current weather (mock data)",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "city": {"type": "string", "description": "City name"}
-                    },
-                    "required": ["city"]
-                }
-            },
-            {
-                "name": "get_time",
-                "description": "Get current time in various timezones",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "timezone": {"type": "string", "description": "Timezone (e.g., UTC, EST, PST)"}
-                    }
-                }
-            },
-            {
-                "name": "calculate",
-                "description": "Perform basic calculations",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "expression": {"type": "string", "description": "Math expression to evaluate"}
-                    },
-                    "required": ["expression"]
-                }
-            }
-        ]);
-
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "tools": tools
-            }
-        }))
+    fn handle_tools_list(&self, request_id: Option<&Value>, reply: &mut Vec<u8>) -> Result<()> {
+        self.tools_list_response.render(request_id, reply)
     }
 
     /// Execute a tool and return the result
-    fn handle_tool_call(&self, request_id: Option<&Value>, params: &Value) -> Result<Value> {
+    async fn handle_tool_call(
+        &self,
+        request_id: Option<&Value>,
+        params: &Value,
+        reply: &mut Vec<u8>,
+    ) -> Result<()> {
         let tool_name = params.get("name").and_then(|n| n.as_str()).unwrap_or("");
 
         let default_arguments = json!({});
@@ -153,110 +151,66 @@ impl HttpMCPServer {
         );
 
         let result = match tool_name {
-            "fetch_url" => self.fetch_url(arguments)?,
+            "fetch_url" => self.fetch_url(arguments).await?,
             "check_weather" => self.check_weather(arguments)?,
             "get_time" => self.get_time(arguments)?,
             "calculate" => self.calculate(arguments)?,
             _ => {
-                return Ok(self.error_response(
+                return error_response(
                     request_id,
                     -32602,
                     &format!("Unknown tool: {}", tool_name),
-                ));
+                    reply,
+                );
             }
         };
 
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        }))
+        result.encode(request_id, reply)
     }
 
     /// Fetch content from a URL
-    fn fetch_url(&self, args: &Value) -> Result<Value> {
+    async fn fetch_url(&self, args: &Value) -> Result<ToolResult> {
         let url = args.get("url").and_then(|u| u.as_str()).unwrap_or("");
 
         // Only fetch URLs from safe domains for testing
-        let safe_domains = [
-            "httpbin.org",
-            "jsonplaceholder.typicode.com",
-            "api.github.com",
-        ];
-
         if let Ok(parsed_url) = url::Url::parse(url) {
             let host = parsed_url.host_str().unwrap_or("");
 
-            if !safe_domains.iter().any(|&domain| host.contains(domain)) {
-                return Ok(json!({
-                    "content": [{
-                        "type": "text",
-                        "text": format!("Error: URL domain '{}' not in safe list for testing", host)
-                    }],
-                    "isError": true
-                }));
+            if !is_safe_host(host) {
+                return Ok(ToolResult::error(format!(
+                    "Error: URL domain '{host}' not in safe list for testing"
+                )));
             }
         } else {
-            return Ok(json!({
-                "content": [{
-                    "type": "text",
-                    "text": "Error: Invalid URL format"
-                }],
-                "isError": true
-            }));
+            return Ok(ToolResult::error("Error: Invalid URL format".to_string()));
         }
 
-        // Create runtime for async request
-        let rt = tokio::runtime::Runtime::new().context("Failed to create tokio runtime")?;
-
-        let result = rt.block_on(async {
-            match self.client.get(url).send().await {
-                Ok(response) => {
-                    let status = response.status();
-                    match response.text().await {
-                        Ok(content) => {
-                            let truncated_content = if content.len() > 500 {
-                                format!("{}...", &content[..500])
-                            } else {
-                                content
-                            };
-
-                            json!({
-                                "content": [{
-                                    "type": "text",
-                                    "text": format!("Status: {}\nContent (first 500 chars):\n{}", status, truncated_content)
-                                }],
-                                "isError": false
-                            })
-                        },
-                        Err(e) => {
-                            json!({
-                                "content": [{
-                                    "type": "text",
-                                    "text": format!("Error reading response body: {}", e)
-                                }],
-                                "isError": true
-                            })
-                        }
+        let request = self
+            .client
+            .get(url)
+            .header(reqwest::header::ACCEPT_ENCODING, "identity");
+
+        Ok(match request.send().await {
+            Ok(response) => {
+                let status = response.status();
+                match read_body_prefix(response, FETCH_PREVIEW_BYTES).await {
+                    Ok((prefix, truncated)) => {
+                        let content = String::from_utf8_lossy(&prefix);
+                        let ellipsis = if truncated { "..." } else { "" };
+
+                        ToolResult::success(format!(
+                            "Status: {status}\nContent (first 500 chars):\n{content}{ellipsis}"
+                        ))
                     }
-                },
-                Err(e) => {
-                    json!({
-                        "content": [{
-                            "type": "text",
-                            "text": format!("Error fetching URL: {}", e)
-                        }],
-                        "isError": true
-                    })
+                    Err(e) => ToolResult::error(format!("Error reading response body: {e}")),
                 }
             }
-        });
-
-        Ok(result)
+            Err(e) => ToolResult::error(format!("Error fetching URL: {e}")),
+        })
     }
 
     /// Return mock weather data
-    fn check_weather(&self, args: &Value) -> Result<Value> {
+    fn check_weather(&self, args: &Value) -> Result<ToolResult> {
         let city = args
             .get("city")
             .and_then(|c| c.as_str())
@@ -265,20 +219,15 @@ impl HttpMCPServer {
         // Mock weather data
         let mut rng = rand::thread_rng();
         let temp = rng.gen_range(10..=30);
-        let conditions = ["Sunny", "Cloudy", "Rainy", "Partly Cloudy"];
-        let condition = conditions[rng.gen_range(0..conditions.len())];
-
-        Ok(json!({
-            "content": [{
-                "type": "text",
-                "text": format!("Weather in {}: {}°C, {}", city, temp, condition)
-            }],
-            "isError": false
-        }))
+        let condition = WEATHER_CONDITIONS[rng.gen_range(0..WEATHER_CONDITIONS.len())];
+
+        Ok(ToolResult::success(format!(
+            "Weather in {city}: {temp}°C, {condition}"
+        )))
     }
 
     /// Get current time in specified timezone
-    fn get_time(&self, args: &Value) -> Result<Value> {
+    fn get_time(&self, args: &Value) -> Result<ToolResult> {
         let timezone = args
             .get("timezone")
             .and_then(|tz| tz.as_str())
@@ -286,152 +235,434 @@ impl HttpMCPServer {
 
         let now = Utc::now();
 
-        // Simple timezone handling
-        let time_str = match timezone.to_uppercase().as_str() {
-            "UTC" => now.format("%Y-%m-%d %H:%M:%S UTC").to_string(),
-            "EST" => {
-                let offset = FixedOffset::west_opt(5 * 3600).unwrap();
-                let local_time = now.with_timezone(&offset);
-                local_time.format("%Y-%m-%d %H:%M:%S EST").to_string()
-            }
-            "PST" => {
-                let offset = FixedOffset::west_opt(8 * 3600).unwrap();
-                let local_time = now.with_timezone(&offset);
-                local_time.format("%Y-%m-%d %H:%M:%S PST").to_string()
-            }
-            "CET" => {
-                let offset = FixedOffset::east_opt(3600).unwrap();
-                let local_time = now.with_timezone(&offset);
-                local_time.format("%Y-%m-%d %H:%M:%S CET").to_string()
-            }
-            "JST" => {
-                let offset = FixedOffset::east_opt(9 * 3600).unwrap();
-                let local_time = now.with_timezone(&offset);
-                local_time.format("%Y-%m-%d %H:%M:%S JST").to_string()
-            }
-            _ => {
+        // Simple timezone handling: one case-insensitive table scan, then the
+        // offset is applied and formatted straight into the result text
+        let known = TIMEZONE_OFFSETS
+            .iter()
+            .find(|(name, _)| name.eq_ignore_ascii_case(timezone));
+
+        let text = match known {
+            Some(&(name, offset_secs)) => {
+                let offset =
+                    FixedOffset::east_opt(offset_secs).context("Invalid timezone offset")?;
                 format!(
-                    "Current time in {}: {} (timezone not recognized, showing UTC)",
-                    timezone,
-                    now.format("%Y-%m-%d %H:%M:%S UTC")
+                    "Current time in {timezone}: {local_time} {name}",
+                    local_time = now.with_timezone(&offset).format("%Y-%m-%d %H:%M:%S")
                 )
             }
+            None => format!(
+                "Current time in {timezone}: {utc_time} (timezone not recognized, showing UTC)",
+                utc_time = now.format("%Y-%m-%d %H:%M:%S UTC")
+            ),
         };
 
-        Ok(json!({
-            "content": [{
-                "type": "text",
-                "text": format!("Current time in {}: {}", timezone, time_str)
-            }],
-            "isError": false
-        }))
+        Ok(ToolResult::success(text))
     }
 
     /// Evaluate a math expression
-    fn calculate(&self, args: &Value) -> Result<Value> {
+    fn calculate(&self, args: &Value) -> Result<ToolResult> {
         let expression = args
             .get("expression")
             .and_then(|e| e.as_str())
             .unwrap_or("");
 
         // Basic calculator using evalexpr crate for safety
-        match evalexpr::eval(expression) {
-            Ok(result) => Ok(json!({
-                "content": [{
-                    "type": "text",
-                    "text": format!("{} = {}", expression, result)
-                }],
-                "isError": false
-            })),
-            Err(e) => Ok(json!({
-                "content": [{
-                    "type": "text",
-                    "text": format!("Error evaluating expression: {}", e)
-                }],
-                "isError": true
-            })),
+        match self.evaluate(expression) {
+            Ok(result) => Ok(ToolResult::success(format!("{expression} = {result}"))),
+            Err(e) => Ok(ToolResult::error(format!(
+                "Error evaluating expression: {e}"
+            ))),
         }
     }
 
-    /// Create an error response
-    fn error_response(&self, request_id: Option<&Value>, code: i32, message: &str) -> Value {
-        json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {
-                "code": code,
-                "message": message
-            }
-        })
+    /// Evaluate an expression, reusing the parsed operator tree for repeated inputs.
+    /// Trees are validated once, before they are cached.
+    fn evaluate(&self, expression: &str) -> Result<evalexpr::Value> {
+        // The cache holds only parsed trees, so one left behind by a panicking
+        // thread is still valid to reuse
+        let mut cache = self
+            .expression_cache
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner);
+        if let Some(tree) = cache.get(expression) {
+            return Ok(tree.eval()?);
+        }
+
+        let tree = evalexpr::build_operator_tree(expression)?;
+        if !is_arithmetic(&tree) {
+            bail!("only numbers and + - * / % ^ are supported");
+        }
+        let result = tree.eval();
+
+        if cache.len() >= EXPRESSION_CACHE_CAPACITY {
+            cache.clear();
+        }
+        cache.insert(expression.to_string(), tree);
+
+        Ok(result?)
     }
 
     /// Main server loop
-    fn run(&mut self) -> Result<()> {
+    async fn run(self: Arc<Self>) -> Result<()> {
         eprintln!(
             "[HTTP MCP] HTTP MCP server started, PID: {}",
             std::process::id()
         );
 
-        let stdin = io::stdin();
-        let reader = BufReader::new(stdin.lock());
+        // In-flight requests are capped: once the limit is reached, stdin is
+        // not read further until one finishes, which pushes back on the client
+        let in_flight = Arc::new(Semaphore::new(MAX_IN_FLIGHT_REQUESTS));
+        let (responses, pending) = mpsc::channel(MAX_IN_FLIGHT_REQUESTS);
+        let writer = tokio::spawn(Arc::clone(&self).write_responses(pending));
+
+        let mut reader = BufReader::with_capacity(INPUT_BUFFER_SIZE, tokio::io::stdin());
+        let mut line = self.take_buffer();
 
         eprintln!("[HTTP MCP] Starting main loop, waiting for input...");
-        for line in reader.lines() {
-            let line = line?;
-            let line = line.trim();
+        loop {
+            line.clear();
+            if reader.read_until(b'\n', &mut line).await? == 0 {
+                break;
+            }
+
+            let request = line.trim_ascii();
+            if request.is_empty() {
+                continue;
+            }
 
-            if line.is_empty() {
+            // The notification needs no reply, so skip decoding it and
+            // spawning a task for it
+            if is_initialized_notification(request) {
+                self.initialized.store(true, Ordering::Relaxed);
+                eprintln!("[HTTP MCP] Client confirmed initialization");
                 continue;
             }
 
-            match serde_json::from_str::<Value>(line) {
-                Ok(request) => {
-                    eprintln!("[HTTP MCP] Received: {}", line);
-
-                    match self.handle_request(request) {
-                        Ok(Some(response)) => {
-                            let response_json = serde_json::to_string(&response)?;
-                            println!("{}", response_json);
-                            io::stdout().flush()?;
-                            eprintln!("[HTTP MCP] Sent: {}", response_json);
-                        }
-                        Ok(None) => {
-                            // Notification, no response needed
-                        }
-                        Err(e) => {
-                            eprintln!("[HTTP MCP] Error handling request: {}", e);
-                            let error = self.error_response(None, -32603, &e.to_string());
-                            let error_json = serde_json::to_string(&error)?;
-                            println!("{}", error_json);
-                            io::stdout().flush()?;
-                        }
+            // Each request runs as its own task so slow fetches overlap
+            // instead of stalling every message queued behind them. The read
+            // buffer itself moves into the task and a pooled one takes its
+            // place, so the line is never copied.
+            let permit = Arc::clone(&in_flight).acquire_owned().await?;
+            let server = Arc::clone(&self);
+            let message = std::mem::replace(&mut line, self.take_buffer());
+            let responses = responses.clone();
+            tokio::spawn(async move {
+                let _permit = permit;
+                let mut reply = server.take_buffer();
+                if let Err(e) = server.handle_line(message.trim_ascii(), &mut reply).await {
+                    // Still answer, so the client is not left waiting for a reply
+                    eprintln!("[HTTP MCP] Failed to encode response: {e}");
+                    reply.clear();
+                    let error = format!("Failed to encode response: {e}");
+                    if let Err(e) = error_response(None, -32603, &error, &mut reply) {
+                        eprintln!("[HTTP MCP] Failed to encode error response: {e}");
+                        reply.clear();
                     }
                 }
-                Err(e) => {
-                    eprintln!("[HTTP MCP] Failed to parse JSON: {}", e);
-                    let error = self.error_response(None, -32700, "Parse error");
-                    let error_json = serde_json::to_string(&error)?;
-                    println!("{}", error_json);
-                    io::stdout().flush()?;
+                server.recycle_buffer(message);
+
+                // The writer hands the buffer back once it is written
+                if reply.is_empty() {
+                    server.recycle_buffer(reply);
+                } else if let Err(e) = responses.send(reply).await {
+                    eprintln!("[HTTP MCP] Dropping reply, stdout writer has stopped: {e}");
                 }
+            });
+        }
+
+        // The writer finishes once every in-flight request has replied
+        drop(responses);
+        writer.await?
+    }
+
+    /// Handle a single line-delimited JSON-RPC message, encoding the reply into
+    /// `reply`. Notifications leave it empty.
+    async fn handle_line(&self, line: &[u8], reply: &mut Vec<u8>) -> Result<()> {
+        match serde_json::from_slice::<RpcRequest>(line) {
+            Ok(request) => {
+                eprintln!(
+                    "[HTTP MCP] Received: {line}",
+                    line = String::from_utf8_lossy(line)
+                );
+
+                if let Err(e) = self.handle_request(request, reply).await {
+                    eprintln!("[HTTP MCP] Error handling request: {e}");
+                    reply.clear();
+                    error_response(None, -32603, &e.to_string(), reply)?;
+                }
+                Ok(())
+            }
+            Err(e) => {
+                eprintln!("[HTTP MCP] Failed to parse JSON: {e}");
+                error_response(None, -32700, "Parse error", reply)
+            }
+        }
+    }
+
+    /// Write replies to stdout as they complete, flushing once no more are queued
+    async fn write_responses(self: Arc<Self>, mut pending: mpsc::Receiver<Vec<u8>>) -> Result<()> {
+        let mut out = BufWriter::with_capacity(OUTPUT_BUFFER_SIZE, tokio::io::stdout());
+
+        while let Some(response) = pending.recv().await {
+            write_message_async(&mut out, &response).await?;
+            eprintln!(
+                "[HTTP MCP] Sent: {response}",
+                response = String::from_utf8_lossy(&response)
+            );
+            self.recycle_buffer(response);
+
+            // A burst of completed requests shares a single write to stdout
+            if pending.is_empty() {
+                out.flush().await?;
             }
         }
 
+        out.flush().await?;
         Ok(())
     }
+
+    /// Take an empty message buffer, reusing a pooled allocation when one is idle
+    fn take_buffer(&self) -> Vec<u8> {
+        self.buffer_pool().pop().unwrap_or_default()
+    }
+
+    /// Return a message buffer to the pool so its allocation can be reused
+    fn recycle_buffer(&self, mut buffer: Vec<u8>) {
+        if buffer.capacity() > MAX_POOLED_BUFFER_SIZE {
+            return;
+        }
+        buffer.clear();
+
+        let mut pool = self.buffer_pool();
+        if pool.len() < BUFFER_POOL_CAPACITY {
+            pool.push(buffer);
+        }
+    }
+
+    /// Lock the buffer pool. Pooled buffers are always empty, so a pool left
+    /// behind by a panicking thread is still safe to use.
+    fn buffer_pool(&self) -> MutexGuard<'_, Vec<Vec<u8>>> {
+        self.buffer_pool
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner)
+    }
+}
+
+/// Check a URL host against the safe domain list. Only exact matches and
+/// subdomains are accepted, so hosts like `httpbin.org.evil.com` are rejected.
+fn is_safe_host(host: &str) -> bool {
+    SAFE_DOMAINS.iter().any(|&domain| {
+        host.strip_suffix(domain)
+            .is_some_and(|rest| rest.is_empty() || rest.ends_with('.'))
+    })
+}
+
+/// Redirect policy that keeps fetch_url inside the safe domain list. Every hop
+/// is checked, so an allowed host cannot bounce the request somewhere else.
+fn safe_redirect_policy() -> reqwest::redirect::Policy {
+    reqwest::redirect::Policy::custom(|attempt| {
+        let host = attempt.url().host_str().unwrap_or("").to_string();
+        if !is_safe_host(&host) {
+            attempt.error(format!("redirect to '{host}' not in safe list for testing"))
+        } else if attempt.previous().len() >= MAX_REDIRECTS {
+            attempt.error("too many redirects")
+        } else {
+            attempt.follow()
+        }
+    })
+}
+
+/// Check that an expression tree only does arithmetic on numeric literals.
+/// Variables, functions, strings, comparisons and assignments are rejected.
+fn is_arithmetic(tree: &evalexpr::Node) -> bool {
+    use evalexpr::Operator;
+
+    tree.iter().all(|node| match node.operator() {
+        Operator::RootNode
+        | Operator::Add
+        | Operator::Sub
+        | Operator::Neg
+        | Operator::Mul
+        | Operator::Div
+        | Operator::Mod
+        | Operator::Exp => true,
+        Operator::Const { value } => value.is_number(),
+        _ => false,
+    })
+}
+
+/// Read at most `limit` bytes of a response body, reporting whether it was truncated.
+/// The remainder is discarded instead of being buffered and decoded.
+async fn read_body_prefix(
+    mut response: reqwest::Response,
+    limit: usize,
+) -> reqwest::Result<(Vec<u8>, bool)> {
+    let content_length = response.content_length();
+    let mut prefix = Vec::with_capacity(limit + 1);
+    let mut received = 0;
+
+    // One byte past the limit is enough to know the body was truncated
+    while prefix.len() <= limit {
+        match response.chunk().await? {
+            Some(chunk) => {
+                received += chunk.len() as u64;
+                let wanted = (limit + 1 - prefix.len()).min(chunk.len());
+                prefix.extend_from_slice(&chunk[..wanted]);
+            }
+            None => break,
+        }
+    }
+
+    let truncated = prefix.len() > limit;
+    prefix.truncate(limit);
+
+    // Finishing a body lets its connection go back to the pool, which is
+    // cheaper than a new TCP + TLS handshake on the next fetch. That is only
+    // worth it when the declared remainder is small, and it happens in the
+    // background so the tool result is not held up. Other bodies are dropped
+    // unread and their connection is closed.
+    let remaining = content_length.map(|length| length.saturating_sub(received));
+    if truncated && remaining.is_some_and(|remaining| remaining <= FETCH_DRAIN_BYTES) {
+        tokio::spawn(async move { while let Ok(Some(_)) = response.chunk().await {} });
+    }
+
+    Ok((prefix, truncated))
 }
 
-fn main() -> Result<()> {
-    // Set stdout to line buffering for better subprocess communication
-    use std::io::Write;
-    std::io::stdout().flush().unwrap();
+/// Result of the initialize request; static for the lifetime of the process
+fn initialize_result() -> Value {
+    json!({
+        "protocolVersion": "2024-11-05",
+        "serverInfo": {
+            "name": "http-mcp-server",
+            "version": "1.0.0"
+        },
+        "capabilities": {
+            "tools": {
+                "listChanged": true
+            }
+        }
+    })
+}
 
-    let mut server = HttpMCPServer::new();
+/// Definitions returned by tools/list; static for the lifetime of the process
+fn tool_definitions() -> Value {
+    json!([
+        {
+            "name": "fetch_url",
+            "description": "Fetch content from a URL",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "url": {"type": "string", "description": "The URL to fetch"}
+                },
+                "required": ["url"]
+            }
+        },
+        {
+            "name": "check_weather",
+            "description": "Get current weather (mock data)",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "city": {"type": "string", "description": "City name"}
+                },
+                "required": ["city"]
+            }
+        },
+        {
+            "name": "get_time",
+            "description": "Get current time in various timezones",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "timezone": {"type": "string", "description": "Timezone (e.g., UTC, EST, PST)"}
+                }
+            }
+        },
+        {
+            "name": "calculate",
+            "description": "Perform basic calculations",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "expression": {"type": "string", "description": "Math expression to evaluate"}
+                },
+                "required": ["expression"]
+            }
+        }
+    ])
+}
 
-    if let Err(e) = server.run() {
+// Requests are short and I/O bound, so one event-loop thread is enough.
+// It avoids starting a worker thread per core and the cross-thread task
+// handoff of the work-stealing scheduler.
+#[tokio::main(flavor = "current_thread")]
+async fn main() -> Result<()> {
+    let server = Arc::new(HttpMCPServer::new()?);
+
+    if let Err(e) = server.run().await {
         eprintln!("[HTTP MCP] Server error: {}", e);
         std::process::exit(1);
     }
 
     Ok(())
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_is_safe_host() {
+        assert!(is_safe_host("httpbin.org"));
+        assert!(is_safe_host("api.github.com"));
+        assert!(is_safe_host("eu.httpbin.org"));
+
+        assert!(!is_safe_host(""));
+        assert!(!is_safe_host("github.com"));
+        assert!(!is_safe_host("evilhttpbin.org"));
+        assert!(!is_safe_host("httpbin.org.evil.com"));
+    }
+
+    #[tokio::test]
+    async fn test_redirect_to_unsafe_host_is_refused() {
+        use tokio::io::AsyncReadExt;
+
+        let listener = tokio::net::TcpListener::bind("127.0.0.1:0").await.unwrap();
+        let addr = listener.local_addr().unwrap();
+        tokio::spawn(async move {
+            let (mut socket, _) = listener.accept().await.unwrap();
+            let mut request = [0u8; 1024];
+            let _ = socket.read(&mut request).await;
+            let response =
+                "HTTP/1.1 302 Found\r\nLocation: http://evil.example/\r\nContent-Length: 0\r\n\r\n";
+            socket.write_all(response.as_bytes()).await.unwrap();
+        });
+
+        let server = HttpMCPServer::new().unwrap();
+        let error = server
+            .client
+            .get(format!("http://{addr}/redirect"))
+            .send()
+            .await
+            .unwrap_err();
+        assert!(error.is_redirect());
+        assert!(format!("{error:?}").contains("evil.example"));
+    }
+
+    #[test]
+    fn test_is_arithmetic() {
+        let accepts =
+            |expression| is_arithmetic(&evalexpr::build_operator_tree(expression).unwrap());
+
+        assert!(accepts("15 + 25 * 2"));
+        assert!(accepts("-(2.5 - 1) ^ 2 / 4 % 3"));
+
+        assert!(!accepts("x + 1"));
+        assert!(!accepts("max(1, 2)"));
+        assert!(!accepts("\"a\" + \"b\""));
+        assert!(!accepts("1 == 1"));
+        assert!(!accepts("x = 1; x"));
+    }
+}
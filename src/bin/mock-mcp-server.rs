@@ -6,121 +6,91 @@
 
 use anyhow::Result;
 use chrono::{DateTime, Utc};
+use replicante::mcp_server::{
+    INPUT_BUFFER_SIZE, OUTPUT_BUFFER_SIZE, ResponseTemplate, RpcRequest, ToolResult,
+    error_response, is_initialized_notification, write_message,
+};
 use serde_json::{Value, json};
-use std::io::{self, BufRead, BufReader, Write};
+use std::io::{self, BufRead, BufReader, BufWriter, Write};
 
 /// Mock MCP Server implementation
 struct MockMCPServer {
     initialized: bool,
+    /// Unix second of the last get_time call
+    time_second: i64,
+    /// RFC 3339 text for `time_second`, reused while the clock stays within
+    /// the same second
+    time_text: String,
+    initialize_response: ResponseTemplate,
+    tools_list_response: ResponseTemplate,
 }
 
 impl MockMCPServer {
-    fn new() -> Self {
-        Self { initialized: false }
+    fn new() -> Result<Self> {
+        Ok(Self {
+            initialized: false,
+            time_second: i64::MIN,
+            time_text: String::new(),
+            initialize_response: ResponseTemplate::new(&initialize_result())?,
+            tools_list_response: ResponseTemplate::new(&json!({ "tools": tool_definitions() }))?,
+        })
     }
 
     /// Handle a JSON-RPC request and return a response
-    fn handle_request(&mut self, request: Value) -> Result<Option<Value>> {
-        let method = request.get("method").and_then(|m| m.as_str()).unwrap_or("");
-
-        let default_params = json!({});
-        let params = request.get("params").unwrap_or(&default_params);
-
-        let request_id = request.get("id");
+    fn handle_request(&mut self, request: RpcRequest, reply: &mut Vec<u8>) -> Result<()> {
+        let method = request.method.as_str();
+        let params = &request.params;
+        let request_id = request.id.as_ref();
 
         eprintln!("[Mock MCP] Handling request: {}", method);
 
         match method {
-            "initialize" => Ok(Some(self.handle_initialize(request_id, params)?)),
+            "initialize" => self.handle_initialize(request_id, params, reply),
             "initialized" => {
                 // This is a notification, no response needed
                 self.initialized = true;
                 eprintln!("[Mock MCP] Server initialized");
-                Ok(None)
+                Ok(())
             }
-            "tools/list" => Ok(Some(self.handle_tools_list(request_id)?)),
-            "tools/call" => Ok(Some(self.handle_tool_call(request_id, params)?)),
-            _ => Ok(Some(self.error_response(
+            "tools/list" => self.handle_tools_list(request_id, reply),
+            "tools/call" => self.handle_tool_call(request_id, params, reply),
+            _ => error_response(
                 request_id,
                 -32601,
                 &format!("Method not found: {}", method),
-            ))),
+                reply,
+            ),
         }
     }
 
     /// Handle the initialize request
-    fn handle_initialize(&self, request_id: Option<&Value>, params: &Value) -> Result<Value> {
+    fn handle_initialize(
+        &self,
+        request_id: Option<&Value>,
+        params: &Value,
+        reply: &mut Vec<u8>,
+    ) -> Result<()> {
         let default_client_info = json!({});
         let client_info = params.get("clientInfo").unwrap_or(&default_client_info);
         eprintln!("[Mock MCP] Initialize request from client: {}", client_info);
 
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "serverInfo": {
-                    "name": "mock-mcp-server",
-                    "version": "1.0.0"
-                },
-                "capabilities": {
-                    "tools": {
-                        "listChanged": true
-                    }
-                }
-            }
-        }))
+        self.initialize_response.render(request_id, reply)
     }
 
     /// Handle the tools/list request
-    fn handle_tools_list(&self, request_id: Option<&Value>) -> Result<Value> {
+    fn handle_tools_list(&self, request_id: Option<&Value>, reply: &mut Vec<u8>) -> Result<()> {
         eprintln!("[Mock MCP] Listing available tools");
 
-        let tools = json!([
-            {
-                "name": "echo",
-                "description": "Echoes back the input",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "message": {"type": "string"}
-                    },
-                    "required": ["message"]
-                }
-            },
-            {
-                "name": "add",
-                "description": "Adds two numbers",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "a": {"type": "number"},
-                        "b": {"type": "number"}
-                    },
-                    "required": ["a", "b"]
-                }
-            },
-            {
-                "name": "get_time",
-                "description": "Gets the current time",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            }
-        ]);
-
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "tools": tools
-            }
-        }))
+        self.tools_list_response.render(request_id, reply)
     }
 
     /// Handle a tool call request
-    fn handle_tool_call(&self, request_id: Option<&Value>, params: &Value) -> Result<Value> {
+    fn handle_tool_call(
+        &mut self,
+        request_id: Option<&Value>,
+        params: &Value,
+        reply: &mut Vec<u8>,
+    ) -> Result<()> {
         let tool_name = params.get("name").and_then(|n| n.as_str()).unwrap_or("");
 
         let default_arguments = json!({});
@@ -138,63 +108,40 @@ impl MockMCPServer {
                     .and_then(|m| m.as_str())
                     .unwrap_or("");
 
-                json!({
-                    "content": [{
-                        "type": "text",
-                        "text": format!("Echo: {}", message)
-                    }],
-                    "isError": false
-                })
+                ToolResult::success(format!("Echo: {message}"))
             }
             "add" => {
                 let a = arguments.get("a").and_then(|n| n.as_f64()).unwrap_or(0.0);
                 let b = arguments.get("b").and_then(|n| n.as_f64()).unwrap_or(0.0);
 
-                json!({
-                    "content": [{
-                        "type": "text",
-                        "text": format!("Result: {}", a + b)
-                    }],
-                    "isError": false
-                })
+                ToolResult::success(format!("Result: {sum}", sum = a + b))
             }
             "get_time" => {
-                let now: DateTime<Utc> = Utc::now();
-
-                json!({
-                    "content": [{
-                        "type": "text",
-                        "text": format!("Current time: {}", now.to_rfc3339())
-                    }],
-                    "isError": false
-                })
+                ToolResult::success(format!("Current time: {time}", time = self.current_time()))
             }
             _ => {
-                return Ok(self.error_response(
+                return error_response(
                     request_id,
                     -32602,
                     &format!("Unknown tool: {}", tool_name),
-                ));
+                    reply,
+                );
             }
         };
 
-        Ok(json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        }))
+        result.encode(request_id, reply)
     }
 
-    /// Create an error response
-    fn error_response(&self, request_id: Option<&Value>, code: i32, message: &str) -> Value {
-        json!({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {
-                "code": code,
-                "message": message
-            }
-        })
+    /// Current time in RFC 3339 form at second granularity, formatted at most
+    /// once per second
+    fn current_time(&mut self) -> &str {
+        let now = Utc::now().timestamp();
+        if self.time_second != now {
+            let second = DateTime::<Utc>::from_timestamp(now, 0).unwrap_or_default();
+            self.time_second = now;
+            self.time_text = second.to_rfc3339();
+        }
+        &self.time_text
     }
 
     /// Main server loop - read from stdin, write to stdout
@@ -205,60 +152,145 @@ impl MockMCPServer {
         );
 
         let stdin = io::stdin();
-        let reader = BufReader::new(stdin.lock());
+        let mut reader = BufReader::with_capacity(INPUT_BUFFER_SIZE, stdin.lock());
+        let stdout = io::stdout();
+        let mut out = BufWriter::with_capacity(OUTPUT_BUFFER_SIZE, stdout.lock());
+        let mut line = Vec::new();
+        let mut reply = Vec::new();
 
         eprintln!("[Mock MCP] Starting main loop, waiting for input...");
-        for line in reader.lines() {
-            let line = line?;
-            let line = line.trim();
+        loop {
+            line.clear();
+            if reader.read_until(b'\n', &mut line)? == 0 {
+                break;
+            }
 
-            if line.is_empty() {
-                continue;
+            self.handle_line(line.trim_ascii(), &mut reply, &mut out)?;
+
+            // Flush only once no more input is queued, so a burst of
+            // requests shares a single write to stdout
+            if reader.buffer().is_empty() {
+                out.flush()?;
             }
+        }
 
-            match serde_json::from_str::<Value>(line) {
-                Ok(request) => {
-                    eprintln!("[Mock MCP] Received: {}", line);
-
-                    match self.handle_request(request) {
-                        Ok(Some(response)) => {
-                            let response_json = serde_json::to_string(&response)?;
-                            println!("{}", response_json);
-                            io::stdout().flush()?;
-                            eprintln!("[Mock MCP] Sent: {}", response_json);
-                        }
-                        Ok(None) => {
-                            // Notification, no response needed
-                        }
-                        Err(e) => {
-                            eprintln!("[Mock MCP] Error handling request: {}", e);
-                            let error = self.error_response(None, -32603, &e.to_string());
-                            let error_json = serde_json::to_string(&error)?;
-                            println!("{}", error_json);
-                            io::stdout().flush()?;
-                        }
-                    }
-                }
-                Err(e) => {
-                    eprintln!("[Mock MCP] Failed to parse JSON: {}", e);
-                    let error = self.error_response(None, -32700, "Parse error");
-                    let error_json = serde_json::to_string(&error)?;
-                    println!("{}", error_json);
-                    io::stdout().flush()?;
+        out.flush()?;
+        Ok(())
+    }
+
+    /// Handle a single line-delimited JSON-RPC message
+    ///
+    /// `reply` is a scratch buffer reused across lines so steady-state
+    /// responses are encoded without allocating.
+    fn handle_line(
+        &mut self,
+        line: &[u8],
+        reply: &mut Vec<u8>,
+        out: &mut impl Write,
+    ) -> Result<()> {
+        if line.is_empty() {
+            return Ok(());
+        }
+
+        // The notification needs no reply, so skip decoding it altogether
+        if is_initialized_notification(line) {
+            self.initialized = true;
+            eprintln!("[Mock MCP] Server initialized");
+            return Ok(());
+        }
+
+        reply.clear();
+        match serde_json::from_slice::<RpcRequest>(line) {
+            Ok(request) => {
+                eprintln!(
+                    "[Mock MCP] Received: {line}",
+                    line = String::from_utf8_lossy(line)
+                );
+
+                if let Err(e) = self.handle_request(request, reply) {
+                    eprintln!("[Mock MCP] Error handling request: {e}");
+                    reply.clear();
+                    error_response(None, -32603, &e.to_string(), reply)?;
                 }
             }
+            Err(e) => {
+                eprintln!("[Mock MCP] Failed to parse JSON: {e}");
+                error_response(None, -32700, "Parse error", reply)?;
+            }
+        }
+
+        // An empty reply means the message was a notification
+        if !reply.is_empty() {
+            write_message(out, reply)?;
+            eprintln!(
+                "[Mock MCP] Sent: {reply}",
+                reply = String::from_utf8_lossy(reply)
+            );
         }
 
         Ok(())
     }
 }
 
+/// Result of the initialize request; static for the lifetime of the process
+fn initialize_result() -> Value {
+    json!({
+        "protocolVersion": "2024-11-05",
+        "serverInfo": {
+            "name": "mock-mcp-server",
+            "version": "1.0.0"
+        },
+        "capabilities": {
+            "tools": {
+                "listChanged": true
+            }
+        }
+    })
+}
+
+/// Definitions returned by tools/list; static for the lifetime of the process
+fn tool_definitions() -> Value {
+    json!([
+        {
+            "name": "echo",
+            "description": "Echoes back the input",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string"}
+                },
+                "required": ["message"]
+            }
+        },
+        {
+            "name": "add",
+            "description": "Adds two numbers",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "a": {"type": "number"},
+                    "b": {"type": "number"}
+                },
+                "required": ["a", "b"]
+            }
+        },
+        {
+            "name": "get_time",
+            "description": "Gets the current time",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    ])
+}
+
 fn main() -> Result<()> {
     // Set stdout to line buffering for better subprocess communication
     use std::io::Write;
     std::io::stdout().flush().unwrap();
 
-    let mut server = MockMCPServer::new();
+    let mut server = MockMCPServer::new()?;
 
     if let Err(e) = server.run() {
         eprintln!("[Mock MCP] Server error: {}", e);
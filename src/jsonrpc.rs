@@ -116,6 +116,14 @@ impl Message {
             .map_err(|e| anyhow::anyhow!("Failed to serialize JSON-RPC message: {}", e))
     }
 
+    /// Serialize as a newline-terminated frame for line-delimited stdio transports
+    pub fn to_frame(&self) -> Result<Vec<u8>> {
+        let mut frame = serde_json::to_vec(self)
+            .map_err(|e| anyhow::anyhow!("Failed to serialize JSON-RPC message: {}", e))?;
+        frame.push(b'\n');
+        Ok(frame)
+    }
+
     #[allow(dead_code)]
     pub fn id(&self) -> Option<&RequestId> {
         match self {
@@ -12,6 +12,7 @@ pub mod jsonrpc;
 pub mod llm;
 pub mod mcp;
 pub mod mcp_protocol;
+pub mod mcp_server;
 pub mod state;
 pub mod supervisor;
 
@@ -5,9 +5,9 @@ use serde_json::Value;
 use std::collections::HashMap;
 use std::process::Stdio;
 use std::sync::Arc;
-use tokio::io::{AsyncBufReadExt, AsyncWriteExt, BufReader};
+use tokio::io::{AsyncBufReadExt, AsyncWriteExt, BufReader, BufWriter};
 use tokio::process::{Child, Command};
-use tokio::sync::{Mutex, oneshot};
+use tokio::sync::{Mutex, mpsc, oneshot};
 use tokio::time::{Duration, interval, timeout};
 use tracing::{debug, error, info, warn};
 
@@ -17,6 +17,12 @@ use crate::mcp_protocol::{
     ToolsListResult,
 };
 
+/// Buffer size for the framed stdio transport to each MCP server
+const PIPE_BUFFER_SIZE: usize = 64 * 1024;
+
+/// Sender half of a server's stdin writer task; each item is one encoded frame
+type StdinSender = mpsc::UnboundedSender<Vec<u8>>;
+
 #[derive(Debug, Clone, Deserialize, Serialize)]
 pub struct MCPServerConfig {
     pub name: String,
@@ -66,7 +72,7 @@ struct MCPServer {
     name: String,
     config: MCPServerConfig,
     process: Option<Child>,
-    stdin: Option<Arc<Mutex<tokio::process::ChildStdin>>>,
+    stdin: Option<StdinSender>,
     tools: Vec<ToolInfo>,
     pending_requests: HashMap<RequestId, oneshot::Sender<Response>>,
     initialized: bool,
@@ -149,12 +155,21 @@ impl MCPClient {
             server_guard.name
         );
 
+        // Server stderr is only ever surfaced as debug logs. When those are
+        // disabled, discard it at the source instead of piping it through a
+        // reader task just to drop every line.
+        let forward_stderr = tracing::enabled!(tracing::Level::DEBUG);
+
         // Spawn the MCP server process
         let mut cmd = Command::new(&config.command);
         cmd.args(&config.args)
             .stdin(Stdio::piped())
             .stdout(Stdio::piped())
-            .stderr(Stdio::piped())
+            .stderr(if forward_stderr {
+                Stdio::piped()
+            } else {
+                Stdio::null()
+            })
             .kill_on_drop(true);
 
         debug!(
@@ -179,28 +194,51 @@ impl MCPClient {
             .stdout
             .take()
             .ok_or_else(|| anyhow::anyhow!("Failed to get stdout handle"))?;
-        let stderr = child
-            .stderr
-            .take()
-            .ok_or_else(|| anyhow::anyhow!("Failed to get stderr handle"))?;
+        let stderr = child.stderr.take();
 
         server_guard.process = Some(child);
         let server_name = server_guard.name.clone();
 
         // Store stdin writer in the server struct first
-        let stdin = Arc::new(Mutex::new(stdin));
-        server_guard.stdin = Some(stdin.clone());
+        let (stdin_tx, stdin_rx) = mpsc::unbounded_channel();
+        server_guard.stdin = Some(stdin_tx.clone());
         drop(server_guard); // Release lock before spawning tasks
 
+        // Spawn task that owns stdin, so concurrent requests are pipelined
+        // and a burst of queued frames is written with a single flush
+        let server_name_stdin = server_name.clone();
+        tokio::spawn(Self::write_frames(
+            server.clone(),
+            stdin,
+            stdin_tx.downgrade(),
+            stdin_rx,
+            server_name_stdin,
+        ));
+
         // Spawn task to handle stdout (JSON-RPC responses)
         let server_clone = server.clone();
         let server_name_stdout = server_name.clone();
         tokio::spawn(async move {
-            let reader = BufReader::new(stdout);
-            let mut lines = reader.lines();
+            let mut reader = BufReader::with_capacity(PIPE_BUFFER_SIZE, stdout);
+            let mut buf = Vec::with_capacity(1024);
+
+            loop {
+                buf.clear();
+                match reader.read_until(b'\n', &mut buf).await {
+                    Ok(0) => break,
+                    Ok(_) => {}
+                    Err(e) => {
+                        error!("Failed to read from {server_name_stdout}: {e}");
+                        break;
+                    }
+                }
 
-            while let Ok(Some(line)) = lines.next_line().await {
-                if line.trim().is_empty() {
+                let Ok(line) = std::str::from_utf8(&buf) else {
+                    error!("Received non UTF-8 frame from {server_name_stdout}");
+                    continue;
+                };
+                let line = line.trim();
+                if line.is_empty() {
                     continue;
                 }
 
@@ -209,7 +247,7 @@ impl MCPClient {
                 // Yield to allow other tasks to run
                 tokio::task::yield_now().await;
 
-                match Message::parse(&line) {
+                match Message::parse(line) {
                     Ok(msg) => {
                         if let Err(e) = Self::handle_message(server_clone.clone(), msg).await {
                             error!("Failed to handle message: {e}");
@@ -228,15 +266,23 @@ impl MCPClient {
         });
 
         // Spawn task to handle stderr (logging)
-        let server_name_stderr = server_name.clone();
-        tokio::spawn(async move {
-            let reader = BufReader::new(stderr);
-            let mut lines = reader.lines();
-
-            while let Ok(Some(line)) = lines.next_line().await {
-                debug!("[{server_name_stderr}] {line}");
-            }
-        });
+        if let Some(stderr) = stderr {
+            let server_name_stderr = server_name.clone();
+            tokio::spawn(async move {
+                let mut reader = BufReader::new(stderr);
+                let mut buf = Vec::new();
+
+                loop {
+                    buf.clear();
+                    match reader.read_until(b'\n', &mut buf).await {
+                        Ok(0) | Err(_) => break,
+                        Ok(_) => {}
+                    }
+                    let line = String::from_utf8_lossy(buf.trim_ascii_end());
+                    debug!("[{server_name_stderr}] {line}");
+                }
+            });
+        }
 
         // Wait a bit for the handlers to be ready
         debug!("Waiting for MCP server handlers to be ready...");
@@ -249,7 +295,7 @@ impl MCPClient {
         );
         match timeout(
             Duration::from_secs(10),
-            Self::initialize_connection(server.clone(), stdin),
+            Self::initialize_connection(server.clone(), stdin_tx),
         )
         .await
         {
@@ -272,9 +318,52 @@ impl MCPClient {
         Ok(())
     }
 
+    /// Drain encoded frames into the server's stdin until every sender is gone
+    async fn write_frames(
+        server: Arc<Mutex<MCPServer>>,
+        stdin: tokio::process::ChildStdin,
+        channel: mpsc::WeakUnboundedSender<Vec<u8>>,
+        mut frames: mpsc::UnboundedReceiver<Vec<u8>>,
+        server_name: String,
+    ) {
+        let mut writer = BufWriter::with_capacity(PIPE_BUFFER_SIZE, stdin);
+
+        while let Some(frame) = frames.recv().await {
+            let mut result = writer.write_all(&frame).await;
+
+            // Coalesce everything already queued behind this frame
+            while result.is_ok()
+                && let Ok(frame) = frames.try_recv()
+            {
+                result = writer.write_all(&frame).await;
+            }
+
+            if let Err(e) = result.and(writer.flush().await) {
+                warn!("Failed to write to {server_name} stdin: {e}");
+
+                // Nothing queued can be answered now; fail waiters immediately.
+                // A writer left over from before a restart must not touch the
+                // requests of the process that replaced it.
+                let mut server_guard = server.lock().await;
+                let is_current = channel.upgrade().is_some_and(|own| {
+                    server_guard
+                        .stdin
+                        .as_ref()
+                        .is_some_and(|current| current.same_channel(&own))
+                });
+                if is_current {
+                    server_guard.pending_requests.clear();
+                }
+                break;
+            }
+        }
+
+        debug!("Stdin writer for {server_name} stopped");
+    }
+
     async fn initialize_connection(
         server: Arc<Mutex<MCPServer>>,
-        stdin: Arc<Mutex<tokio::process::ChildStdin>>,
+        stdin: StdinSender,
     ) -> Result<()> {
         let server_guard = server.lock().await;
         let server_name = server_guard.name.clone();
@@ -351,7 +440,7 @@ impl MCPClient {
 
     async fn discover_server_tools(
         server: Arc<Mutex<MCPServer>>,
-        stdin: Arc<Mutex<tokio::process::ChildStdin>>,
+        stdin: StdinSender,
     ) -> Result<()> {
         let request = Request::new("tools/list", Some(serde_json::json!({})));
         let response = Self::send_request(server.clone(), stdin, request).await?;
@@ -382,7 +471,7 @@ impl MCPClient {
 
     async fn send_request(
         server: Arc<Mutex<MCPServer>>,
-        stdin: Arc<Mutex<tokio::process::ChildStdin>>,
+        stdin: StdinSender,
         request: Request,
     ) -> Result<Response> {
         let request_id = request
@@ -399,17 +488,21 @@ impl MCPClient {
             server_guard.pending_requests.insert(request_id.clone(), tx);
         }
 
-        // Send request
-        let message = Message::Request(request);
-        let json = message.to_string()? + "\n";
+        // Queue request for the stdin writer task
+        let frame = Message::Request(request).to_frame()?;
+        // The frame moves into the channel, so keep a copy for the log line,
+        // but only when it will actually be logged
+        let logged = tracing::enabled!(tracing::Level::DEBUG)
+            .then(|| String::from_utf8_lossy(&frame).trim_end().to_string());
 
-        {
-            let mut stdin_guard = stdin.lock().await;
-            stdin_guard.write_all(json.as_bytes()).await?;
-            stdin_guard.flush().await?;
+        if stdin.send(frame).is_err() {
+            let mut server_guard = server.lock().await;
+            server_guard.pending_requests.remove(&request_id);
+            bail!("Server stdin is closed");
+        }
+        if let Some(request) = logged {
+            debug!("Sent request: {request}");
         }
-
-        debug!("Sent request: {request}", request = json.trim());
 
         // Add server name context for debugging
         let server_name = {
@@ -451,20 +544,19 @@ impl MCPClient {
     }
 
     async fn send_notification(
-        stdin: Arc<Mutex<tokio::process::ChildStdin>>,
+        stdin: StdinSender,
         notification: crate::jsonrpc::Notification,
     ) -> Result<()> {
-        let message = Message::Notification(notification);
-        let json = message.to_string()? + "\n";
-
-        let mut stdin_guard = stdin.lock().await;
-        stdin_guard.write_all(json.as_bytes()).await?;
-        stdin_guard.flush().await?;
-
-        debug!(
-            "Sent notification: {notification}",
-            notification = json.trim()
-        );
+        let frame = Message::Notification(notification).to_frame()?;
+        let logged = tracing::enabled!(tracing::Level::DEBUG)
+            .then(|| String::from_utf8_lossy(&frame).trim_end().to_string());
+
+        stdin
+            .send(frame)
+            .map_err(|_| anyhow::anyhow!("Server stdin is closed"))?;
+        if let Some(notification) = logged {
+            debug!("Sent notification: {notification}");
+        }
         Ok(())
     }
 
@@ -0,0 +1,231 @@
+//! Wire-format helpers shared by the stdio MCP server binaries.
+//!
+//! Responses are encoded straight into a caller-owned buffer: the fixed parts
+//! of each message are byte literals and only the variable parts go through
+//! serde.
+
+use anyhow::{Context, Result};
+use serde::Deserialize;
+use serde_json::Value;
+use std::io::Write;
+use tokio::io::{AsyncWrite, AsyncWriteExt};
+
+/// Bytes requested from stdin per read, so a burst of requests costs one
+/// syscall per 64 KiB rather than one per default-sized 8 KiB buffer
+pub const INPUT_BUFFER_SIZE: usize = 64 * 1024;
+
+/// Responses buffered before stdout is flushed during a burst of requests
+pub const OUTPUT_BUFFER_SIZE: usize = 16 * 1024;
+
+/// Encodings of the `initialized` notification recognised without parsing,
+/// as serialized by [`crate::jsonrpc::Notification`] with and without params
+const INITIALIZED_NOTIFICATIONS: [&[u8]; 2] = [
+    br#"{"jsonrpc":"2.0","method":"initialized","params":{}}"#,
+    br#"{"jsonrpc":"2.0","method":"initialized","params":null}"#,
+];
+
+/// Start of every response, up to the request id
+const RESPONSE_PREFIX: &[u8] = br#"{"jsonrpc":"2.0","id":"#;
+
+/// Incoming JSON-RPC request or notification
+#[derive(Deserialize)]
+pub struct RpcRequest {
+    #[serde(default)]
+    pub method: String,
+    #[serde(default)]
+    pub params: Value,
+    #[serde(default)]
+    pub id: Option<Value>,
+}
+
+/// Result of a tool call: a single text content item
+pub struct ToolResult {
+    pub text: String,
+    pub is_error: bool,
+}
+
+impl ToolResult {
+    pub fn success(text: String) -> Self {
+        Self::new(text, false)
+    }
+
+    pub fn error(text: String) -> Self {
+        Self::new(text, true)
+    }
+
+    pub fn new(text: String, is_error: bool) -> Self {
+        Self { text, is_error }
+    }
+
+    /// Encode the tools/call response into the reply buffer
+    pub fn encode(&self, request_id: Option<&Value>, reply: &mut Vec<u8>) -> Result<()> {
+        reply.extend_from_slice(RESPONSE_PREFIX);
+        serde_json::to_writer(&mut *reply, &request_id)?;
+        reply.extend_from_slice(br#","result":{"content":[{"type":"text","text":"#);
+        serde_json::to_writer(&mut *reply, &self.text)?;
+        let tail: &[u8] = if self.is_error {
+            br#"}],"isError":true}}"#
+        } else {
+            br#"}],"isError":false}}"#
+        };
+        reply.extend_from_slice(tail);
+        Ok(())
+    }
+}
+
+/// Pre-encoded response whose only per-request part is the id
+pub struct ResponseTemplate {
+    suffix: Vec<u8>,
+}
+
+impl ResponseTemplate {
+    pub fn new(result: &Value) -> Result<Self> {
+        let mut suffix = br#","result":"#.to_vec();
+        serde_json::to_writer(&mut suffix, result).context("Failed to encode static response")?;
+        suffix.push(b'}');
+        Ok(Self { suffix })
+    }
+
+    /// Splice the request id into the pre-encoded response
+    pub fn render(&self, request_id: Option<&Value>, reply: &mut Vec<u8>) -> Result<()> {
+        reply.extend_from_slice(RESPONSE_PREFIX);
+        serde_json::to_writer(&mut *reply, &request_id)?;
+        reply.extend_from_slice(&self.suffix);
+        Ok(())
+    }
+}
+
+/// Encode an error response into the reply buffer
+pub fn error_response(
+    request_id: Option<&Value>,
+    code: i32,
+    message: &str,
+    reply: &mut Vec<u8>,
+) -> Result<()> {
+    reply.extend_from_slice(RESPONSE_PREFIX);
+    serde_json::to_writer(&mut *reply, &request_id)?;
+    reply.extend_from_slice(br#","error":{"code":"#);
+    serde_json::to_writer(&mut *reply, &code)?;
+    reply.extend_from_slice(br#","message":"#);
+    serde_json::to_writer(&mut *reply, message)?;
+    reply.extend_from_slice(b"}}");
+    Ok(())
+}
+
+/// Check for the exact bytes the client sends as its `initialized` notification.
+/// Anything else, including other spellings of it, takes the parsing path.
+pub fn is_initialized_notification(line: &[u8]) -> bool {
+    INITIALIZED_NOTIFICATIONS.contains(&line)
+}
+
+/// Write an encoded message as one line-delimited frame; the caller decides when to flush
+pub fn write_message(out: &mut impl Write, message: &[u8]) -> Result<()> {
+    out.write_all(message)?;
+    out.write_all(b"\n")?;
+    Ok(())
+}
+
+/// Async counterpart of [`write_message`]
+pub async fn write_message_async(
+    out: &mut (impl AsyncWrite + Unpin),
+    message: &[u8],
+) -> Result<()> {
+    out.write_all(message).await?;
+    out.write_all(b"\n").await?;
+    Ok(())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::jsonrpc::{Message, Request};
+    use serde_json::json;
+
+    fn parse(reply: &[u8]) -> Value {
+        serde_json::from_slice(reply).unwrap()
+    }
+
+    #[test]
+    fn test_response_template_render() {
+        let result = json!({ "tools": [{ "name": "echo", "description": "Say \"hi\"" }] });
+        let template = ResponseTemplate::new(&result).unwrap();
+
+        for id in [Some(json!(7)), Some(json!("req-1")), None] {
+            let mut reply = Vec::new();
+            template.render(id.as_ref(), &mut reply).unwrap();
+            assert_eq!(
+                parse(&reply),
+                json!({ "jsonrpc": "2.0", "id": id, "result": result })
+            );
+        }
+    }
+
+    #[test]
+    fn test_tool_result_encode() {
+        let text = "line \"one\"\n\ttab \\ \u{1} ünï";
+
+        for (result, is_error) in [
+            (ToolResult::success(text.to_string()), false),
+            (ToolResult::error(text.to_string()), true),
+        ] {
+            let mut reply = Vec::new();
+            result.encode(Some(&json!(3)), &mut reply).unwrap();
+            assert_eq!(
+                parse(&reply),
+                json!({
+                    "jsonrpc": "2.0",
+                    "id": 3,
+                    "result": {
+                        "content": [{ "type": "text", "text": text }],
+                        "isError": is_error
+                    }
+                })
+            );
+        }
+
+        let mut reply = Vec::new();
+        ToolResult::success(String::new())
+            .encode(None, &mut reply)
+            .unwrap();
+        assert_eq!(parse(&reply)["id"], Value::Null);
+    }
+
+    #[test]
+    fn test_error_response() {
+        let mut reply = Vec::new();
+        error_response(None, -32700, "Parse error: \"x\"", &mut reply).unwrap();
+        assert_eq!(
+            parse(&reply),
+            json!({
+                "jsonrpc": "2.0",
+                "id": null,
+                "error": { "code": -32700, "message": "Parse error: \"x\"" }
+            })
+        );
+
+        reply.clear();
+        error_response(Some(&json!("a")), -32601, "Method not found", &mut reply).unwrap();
+        assert_eq!(
+            parse(&reply),
+            json!({
+                "jsonrpc": "2.0",
+                "id": "a",
+                "error": { "code": -32601, "message": "Method not found" }
+            })
+        );
+    }
+
+    #[test]
+    fn test_is_initialized_notification() {
+        for params in [Some(json!({})), None] {
+            let frame = Message::Notification(Request::notification("initialized", params))
+                .to_frame()
+                .unwrap();
+            assert!(is_initialized_notification(frame.trim_ascii()));
+        }
+
+        assert!(!is_initialized_notification(
+            br#"{"jsonrpc":"2.0","id":1,"method":"tools/call","params":{"name":"echo","arguments":{"message":"initialized"}}}"#
+        ));
+    }
+}